@@ -6,10 +6,9 @@ import urllib.request
 import webbrowser
 
 import PySimpleGUI as sg
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 
 from main import config
-from stereo import go, bm_sad, bm_ssd, bm_ncc, cv_bm, cv_sgm
+from stereo import go, bm_sad, bm_ssd, bm_ncc, cv_bm, cv_sgm, export_figure, default_preview_size
 
 # constant variables
 BASE_ONLINE_PATH = config["baseURL"]
@@ -25,6 +24,7 @@ online_jobs = None
 window = None
 loadingScreen = None
 show_loading_animation = False
+last_result = None
 gui_queue = queue.Queue()
 
 
@@ -91,7 +91,8 @@ def gui_callback(message):
                     use message *default* to display the default loading text (Berechne 3D-Punktwolke...)
                     use message *done* to hide the screen even if the tread is still running.
                     use message *go* to unhide the screen
-                    use message (*plot*, a matplot figure, execution time in s) as tuple to render the given figure inside the gui
+                    use message (*plot*, png bytes, execution time in s, (disparity, left, right)) as tuple to render
+                    the given image inside the gui
                     """
     gui_queue.put(message, block=True, timeout=50)
 
@@ -168,24 +169,32 @@ def startMatching(event, values):
     threading.Thread(target=theadWorker,
                      args=(go, onlineJob,
                            (jsonPath, algorithm, int(values["-BLOCK_SIZE-"] + 1), int(values["-DISPARITY-"]),
-                            gui_callback,)),
+                            gui_callback, default_preview_size,)),
                      daemon=True) \
         .start()
 
 
-def drawFigure(figure):
+def drawPreview(preview):
     """
-    renders the given plot inside the canvas of the 3rd column
-    :param figure: the matplot figure that should be rendered
+    renders the given image inside the 3rd column
+    :param preview: the png encoded image (bytes) that should be rendered
     """
-    canvas = window.Find('-CANVAS-').TKCanvas
-    # destroy old plots
-    if canvas.children:
-        for child in canvas.winfo_children():
-            child.destroy()
-    figure_canvas_agg = FigureCanvasTkAgg(figure, canvas)
-    figure_canvas_agg.draw()
-    figure_canvas_agg.get_tk_widget().pack(side='top', fill='both', expand=0)
+    window.Find('-CANVAS-').Update(data=preview)
+
+
+def exportFigure():
+    """asks for a file path and exports the last result as high quality matplotlib figure"""
+    if last_result is None:
+        return
+    path = sg.PopupGetFile("Export speichern unter:", save_as=True, default_extension=".png",
+                           file_types=(("PNG", "*.png"), ("PDF", "*.pdf")))
+    if not path:
+        return
+    try:
+        export_figure(*last_result, path)
+    except Exception as e:
+        print("Error during export")
+        print(e)
 
 
 def createLoadingScreen():
@@ -215,7 +224,7 @@ def setDefaultSliderValues(job):
 
 def init_and_run_gui():
     """initializes and starts the gui. This method blocks until the main window is closed"""
-    global window, show_loading_animation, loadingScreen, last_execution_time
+    global window, show_loading_animation, loadingScreen, last_result
 
     # layout of the left side (job selector)
     left_col = [[sg.Listbox(values=listAvailableJobs(), enable_events=True, size=(40, 40), key='-JOB_LIST-')]]
@@ -257,7 +266,8 @@ def init_and_run_gui():
     # the 3rd column, that show the plot
     plot_col = [
         [sg.Text('', key='-CANVAS_HEADER-', size=(45, 1))],
-        [sg.Canvas(key='-CANVAS-', size=(35, 14))]
+        [sg.Image(key='-CANVAS-', size=default_preview_size)],
+        [sg.Button(button_text="Export (matplotlib)", key="-EXPORT-")]
     ]
 
     # full layout (put everything in one row)
@@ -310,6 +320,9 @@ def init_and_run_gui():
         if event.startswith("-GO_"):
             # a start button was pressed
             startMatching(event, values)
+        if event == "-EXPORT-":
+            # export of the last result was requested
+            exportFigure()
         if event == "-LICENCE-":
             # licence was clicked
             onlineJob = getOnlineJob(values['-JOB_LIST-'][0])
@@ -362,7 +375,8 @@ def init_and_run_gui():
                 window.Find("-PLOT_COLUMN-").Update(visible=True)
                 window.Find("-CANVAS_HEADER-").Update("Ausführung: " + values['-JOB_LIST-'][0] + ", "
                                                       + "Dauer: " + str(round(message[2], 3)) + "s")
-                drawFigure(message[1])
+                last_result = message[3]
+                drawPreview(message[1])
             else:
                 # just a message -> display it on the loading screen
                 if loadingScreen:
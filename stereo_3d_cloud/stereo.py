@@ -4,11 +4,13 @@ import time
 import cv2 as cv
 import numpy as np
 import pptk
-from matplotlib import pyplot as plt
-from matplotlib.gridspec import GridSpec
 
 default_block_size = 15
 default_d_max = 5 * 16
+default_preview_size = (800, 600)
+
+# jet colormap as precomputed lookup table (index: normalized disparity, value: BGR color)
+jet_lut = cv.applyColorMap(np.arange(256, dtype=np.uint8).reshape(256, 1), cv.COLORMAP_JET).reshape(256, 3)
 
 
 def disparity_to_3d_cloud(disparity, intrinsic_parameters, extrinsic_parameters, left_img):
@@ -190,6 +192,97 @@ def cv_sgm(left, right, block_size=default_block_size, d_max=default_d_max):
     return np.int16(disparity / 16)
 
 
+def fit_to_size(img, width, height, interpolation=cv.INTER_AREA):
+    """
+    Downscales the given image so that it fits inside width x height, the aspect ratio is kept.
+    Images that already fit are not upscaled.
+    :param img: the image to scale
+    :param width: the max width in pixels
+    :param height: the max height in pixels
+    :param interpolation: the cv interpolation flag that is used for scaling
+    :return: the scaled image
+    """
+    h, w = img.shape[:2]
+    scale = min(width / w, height / h, 1.0)
+    if scale == 1.0:
+        return img
+    return cv.resize(img, (max(1, int(w * scale)), max(1, int(h * scale))), interpolation=interpolation)
+
+
+def colorize_disparity(disparity):
+    """
+    Normalizes the disparity map to 0..255 (min to max) and applies the precomputed jet lookup table.
+    :param disparity: disparity map as matrix
+    :return: the colored disparity map as BGR image
+    """
+    d_min, d_max = float(disparity.min()), float(disparity.max())
+    if d_max > d_min:
+        normalized = ((disparity - d_min) * (255.0 / (d_max - d_min))).astype(np.uint8)
+    else:
+        normalized = np.zeros(disparity.shape, dtype=np.uint8)
+    return jet_lut[normalized]
+
+
+def render_preview(disparity, left, right, size=default_preview_size):
+    """
+    Renders the disparity map (top) and the left and right image (bottom) into one image of the given size.
+    Lightweight replacement for the matplotlib figure, safe to call from a worker thread.
+    :param disparity: disparity map as matrix
+    :param left: the left image
+    :param right: the right image
+    :param size: (width, height) of the rendered image in pixels
+    :return: the rendered image as png encoded bytes
+    """
+    width, height = size
+    title_height = 20
+    cell_height = height // 2 - title_height
+    canvas = np.full((height, width, 3), 255, dtype=np.uint8)
+
+    # scale the disparity before coloring (nearest, to keep the disparity values), the lut is applied on less pixels
+    cells = [
+        ("Disparity map", colorize_disparity(fit_to_size(disparity, width, cell_height, cv.INTER_NEAREST)),
+         0, 0, width),
+        ("Left Image", cv.cvtColor(fit_to_size(left, width // 2, cell_height), cv.COLOR_GRAY2BGR),
+         height // 2, 0, width // 2),
+        ("Right Image", cv.cvtColor(fit_to_size(right, width // 2, cell_height), cv.COLOR_GRAY2BGR),
+         height // 2, width // 2, width // 2),
+    ]
+    for title, img, top, left_bound, cell_width in cells:
+        h, w = img.shape[:2]
+        x = left_bound + (cell_width - w) // 2
+        canvas[top + title_height:top + title_height + h, x:x + w] = img
+        (text_width, _), _ = cv.getTextSize(title, cv.FONT_HERSHEY_SIMPLEX, 0.5, 1)
+        cv.putText(canvas, title, (left_bound + (cell_width - text_width) // 2, top + title_height - 6),
+                   cv.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 0), 1, cv.LINE_AA)
+
+    return cv.imencode(".png", canvas)[1].tobytes()
+
+
+def export_figure(disparity, left, right, path):
+    """
+    Optional high quality export of the disparity map, left and right image as matplotlib figure.
+    Uses the object oriented matplotlib api (no pyplot), so it does not depend on the gui thread.
+    :param disparity: disparity map as matrix
+    :param left: the left image
+    :param right: the right image
+    :param path: the path of the image file that should be written, the format is derived from the file extension
+    """
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+    from matplotlib.gridspec import GridSpec
+
+    fig = Figure(figsize=(8, 6))
+    FigureCanvasAgg(fig)
+    gs = GridSpec(2, 2, figure=fig)
+    for spec, img, cmap, title in [(gs[0, :], disparity, 'jet', "Disparity map"),
+                                   (gs[1, 0], left, 'gray', "Left Image"),
+                                   (gs[1, 1], right, 'gray', "Right Image")]:
+        ax = fig.add_subplot(spec)
+        ax.imshow(img, cmap=cmap)
+        ax.set_title(title), ax.set_xticks([]), ax.set_yticks([])
+    fig.savefig(path, dpi=200)
+
+
 def deserialize_json(path_to_job_json):
     """
     Read and deserialize the given json string and returns the job parameter as dict.
@@ -198,7 +291,9 @@ def deserialize_json(path_to_job_json):
         "pathImageLeft": path to the left image, as string, relative from the json
         "pathImageRight": path to the right image as string, relative from the json
         "intrinsic": dict of intrinsic cam parameters
-        "extrinsic": dict of extrinsic cam parameters}
+        "extrinsic": dict of extrinsic cam parameters
+        "pathDisparity": path to the ground truth disparity map as string, relative from the json, or None
+        "disparityScale": factor the stored ground truth values are divided by (e.g. 256 for kitti pngs)}
     """
     last_delimiter_index = path_to_job_json.rfind("\\") \
         if path_to_job_json.rfind("/") < path_to_job_json.rfind("\\") else path_to_job_json.rfind("/")
@@ -212,11 +307,13 @@ def deserialize_json(path_to_job_json):
         "pathImageLeft": path_prefix + json_obj["pathImageLeft"],
         "pathImageRight": path_prefix + json_obj["pathImageRight"],
         "intrinsic": json_obj["intrinsic"],
-        "extrinsic": json_obj["extrinsic"]
+        "extrinsic": json_obj["extrinsic"],
+        "pathDisparity": path_prefix + json_obj["pathDisparity"] if "pathDisparity" in json_obj else None,
+        "disparityScale": json_obj.get("disparityScale", 1)
     }
 
 
-def go(path_to_job_json, algorithm, blockSize, maxDisparity, gui_callback):
+def go(path_to_job_json, algorithm, blockSize, maxDisparity, gui_callback, preview_size=default_preview_size):
     """Reads the job json, reads the images, runs the given disparity algorithm, calculates the 3d cloud and open pptk
     :param path_to_job_json: path to the json that describes the current job, as string
     :param algorithm: the disparity algorithm to use, as method reference
@@ -226,8 +323,10 @@ def go(path_to_job_json, algorithm, blockSize, maxDisparity, gui_callback):
                          use parameter *default* to display the default loading text (Berechne Disparity...).
                          use parameter *done* to hide the screen even if the tread is still running.
                          use parameter *go* to unhide the loading screen.
-                         use parameter (*plot*, a matplot figure, execution time) as tuple to render the given figure inside the gui.
+                         use parameter (*plot*, png bytes, execution time, (disparity, left, right)) as tuple to
+                         render the given image inside the gui. The matrices can be used for a later export.
                          All other strings will be displayed as loading text inside the loading window.
+    :param preview_size: (width, height) of the rendered preview image in pixels
     """
     # load and preprocess images
     job = deserialize_json(path_to_job_json)
@@ -239,19 +338,9 @@ def go(path_to_job_json, algorithm, blockSize, maxDisparity, gui_callback):
     disparity = algorithm(left, right, blockSize, maxDisparity)
     end = time.time()
 
-    # create figure for gui (disparity map, right image and left image)
-    fig = plt.figure(figsize=(8, 6))
-    gs = GridSpec(2, 2, figure=fig)
-    fig.add_subplot((gs[0, :]))
-    plt.imshow(disparity, cmap='jet')
-    plt.title("Disparity map"), plt.xticks([]), plt.yticks([])
-    fig.add_subplot((gs[1, 0]))
-    plt.imshow(left, cmap='gray')
-    plt.title("Left Image"), plt.xticks([]), plt.yticks([])
-    fig.add_subplot((gs[1, 1]))
-    plt.imshow(right, cmap='gray')
-    plt.title("Right Image"), plt.xticks([]), plt.yticks([])
-    gui_callback(("*plot*", fig, end - start))
+    # render preview for gui (disparity map, left image and right image)
+    preview = render_preview(disparity, left, right, preview_size)
+    gui_callback(("*plot*", preview, end - start, (disparity, left, right)))
 
     # calculate 3d coordinates
     gui_callback("Bereche 3D-Punktwolke aus Disparity-Map")
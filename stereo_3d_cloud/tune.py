@@ -0,0 +1,278 @@
+import argparse
+import json
+import os
+import sys
+import time
+
+import cv2 as cv
+import numpy as np
+
+from main import config
+from stereo import deserialize_json, load, bm_sad, bm_ssd, bm_ncc, cv_bm, cv_sgm
+
+# constant variables
+MAIN_DIR = config["directory"]
+CONFIG_PATH = "../config.json"
+ALGORITHMS = {"bm_ssd": bm_ssd, "bm_ncc": bm_ncc, "cv_bm": cv_bm, "cv_sgm": cv_sgm, "bm_sad": bm_sad}
+DEFAULT_ALGORITHMS = ["cv_bm", "cv_sgm"]
+DEFAULT_BLOCK_SIZES = [5, 9, 13, 17, 21, 25]
+DEFAULT_MAX_DISPARITIES = [32, 48, 64, 80, 96, 112, 128]
+BAD_PIXEL_THRESHOLD = 2
+CONSISTENCY_THRESHOLD = 1
+DEFAULT_REPEATS = 3
+# same ranges as the sliders of the gui
+BLOCK_SIZE_RANGE = (5, 33)
+MAX_DISPARITY_RANGE = (16, 320)
+
+
+def listLocalJobs(dataset):
+    """list all local jobs of the given dataset (first word of the job name until '_')
+    :param dataset: the dataset name, e.g. middlebury
+    :return: an array with the paths of the stereoVisionJob.json files"""
+    jobs = []
+    for file in sorted(os.listdir(MAIN_DIR)):
+        jsonPath = os.path.join(MAIN_DIR, file, "stereoVisionJob.json")
+        if file.split("_")[0] == dataset and os.path.exists(jsonPath):
+            jobs.append(jsonPath)
+    return jobs
+
+
+def loadGroundTruth(path, scale):
+    """
+    Reads a ground truth disparity map (e.g. .pfm or 16 bit .png).
+    :param path: path to the ground truth disparity map
+    :param scale: factor the stored values are divided by
+    :return: the disparity map as float matrix, invalid pixels are nan or None if the file could not be read
+    """
+    gt = cv.imread(path, cv.IMREAD_UNCHANGED)
+    if gt is None:
+        return None
+    gt = gt.astype(np.float32) / scale
+    gt[~np.isfinite(gt) | (gt <= 0)] = np.nan
+    return gt
+
+
+def scoreRegion(shape, maxDisparity, blockSize):
+    """
+    The region that is scored for every grid point. The leftmost maxDisparity columns of the left disparity map and
+    the rightmost maxDisparity columns of the right disparity map are invalid by construction, so both are cropped.
+    Additionally a border of blockSize // 2 is cropped on every side, the block matchers leave it invalid.
+    :param shape: the image shape
+    :param maxDisparity: the largest max disparity of the grid
+    :param blockSize: the largest block size of the grid
+    :return: (row slice, column slice) or None if nothing is left of the image
+    """
+    h, w = shape
+    k = blockSize // 2
+    if w <= 2 * (maxDisparity + k) or h <= 2 * k:
+        return None
+    return slice(k, h - k), slice(maxDisparity + k, w - maxDisparity - k)
+
+
+def badPixelRate(disparity, gt, region):
+    """
+    :param disparity: the calculated disparity map
+    :param gt: the ground truth disparity map, invalid pixels are nan
+    :param region: (row slice, column slice) of the pixels that are scored
+    :return: fraction of valid ground truth pixels with an error above BAD_PIXEL_THRESHOLD
+    """
+    disparity, gt = disparity[region].astype(np.float32), gt[region]
+    valid = ~np.isnan(gt)
+    return float(np.mean(np.abs(disparity[valid] - gt[valid]) > BAD_PIXEL_THRESHOLD))
+
+
+def leftRightInconsistency(algorithm, left, right, disparity, blockSize, maxDisparity, region):
+    """
+    Proxy error if no ground truth is available. Calculates the disparity of the right image (by running the algorithm
+    on the mirrored images) and checks whether both disparity maps point to each other.
+    :param algorithm: the disparity algorithm to use, as method reference
+    :param left: the left image
+    :param right: the right image
+    :param disparity: the already calculated disparity map of the left image
+    :param blockSize: the block size that was used, as int
+    :param maxDisparity: the count of max disparity levels that was used, as int
+    :param region: (row slice, column slice) of the pixels that are scored
+    :return: fraction of pixels that are invalid or inconsistent
+    """
+    disparityRight = algorithm(np.ascontiguousarray(right[:, ::-1]), np.ascontiguousarray(left[:, ::-1]),
+                               blockSize, maxDisparity)[:, ::-1].astype(np.float32)
+    disparity = disparity.astype(np.float32)
+    h, w = disparity.shape
+    xRight = np.arange(w)[None, :] - np.round(disparity).astype(int)
+    matched = disparityRight[np.arange(h)[:, None], np.clip(xRight, 0, w - 1)]
+    consistent = (disparity > 0) & (xRight >= 0) & (np.abs(disparity - matched) <= CONSISTENCY_THRESHOLD)
+    return 1.0 - float(np.mean(consistent[region]))
+
+
+def evaluate(algorithm, jobs, blockSize, maxDisparity, repeats=DEFAULT_REPEATS):
+    """
+    Runs the algorithm on all given jobs and averages runtime and error.
+    Per job one untimed warm-up run is done, the runtime is the minimum of the following timed repeats.
+    :param algorithm: the disparity algorithm to use, as method reference
+    :param jobs: array of (left image, right image, ground truth or None, scored region)
+    :param blockSize: the block size that should be used, as int
+    :param maxDisparity: the count of max disparity levels that should be used, as int
+    :param repeats: count of timed runs per job
+    :return: (mean runtime in s, mean error)
+    """
+    runtimes, errors = [], []
+    for left, right, gt, region in jobs:
+        disparity = algorithm(left, right, blockSize, maxDisparity)
+        timings = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            algorithm(left, right, blockSize, maxDisparity)
+            timings.append(time.perf_counter() - start)
+        runtimes.append(min(timings))
+        if gt is not None:
+            errors.append(badPixelRate(disparity, gt, region))
+        else:
+            errors.append(leftRightInconsistency(algorithm, left, right, disparity, blockSize, maxDisparity,
+                                                 region))
+    return float(np.mean(runtimes)), float(np.mean(errors))
+
+
+def paretoFront(results):
+    """
+    :param results: array of dicts with the keys runtime and error
+    :return: the results that are not dominated by a faster and more accurate one, sorted by runtime
+    """
+    front = []
+    for result in sorted(results, key=lambda r: (r["runtime"], r["error"])):
+        if not front or result["error"] < front[-1]["error"]:
+            front.append(result)
+    return front
+
+
+def choose(front, tolerance):
+    """
+    :param front: the pareto front, sorted by runtime
+    :param tolerance: allowed absolute error above the best error of the front
+    :return: the fastest result of the front whose error is within the tolerance
+    """
+    bestError = min(r["error"] for r in front)
+    return [r for r in front if r["error"] <= bestError + tolerance][0]
+
+
+def writeConfig(dataset, blockSize, maxDisparity):
+    """writes the given values into defaultParameter.datasets of the config.json
+    :param dataset: the dataset name
+    :param blockSize: the block size to write, as int
+    :param maxDisparity: the max disparity to write, as int"""
+    json_file = open(CONFIG_PATH, "r")
+    fileConfig = json.loads(json_file.read())
+    json_file.close()
+    fileConfig["defaultParameter"].setdefault("datasets", {})[dataset] = {
+        "blockSize": blockSize,
+        "maxDisparity": maxDisparity
+    }
+    json_file = open(CONFIG_PATH, "w")
+    json_file.write(json.dumps(fileConfig, indent=2) + "\n")
+    json_file.close()
+
+
+def tune(dataset, algorithmNames, blockSizes, maxDisparities, tolerance, write, repeats=DEFAULT_REPEATS):
+    """
+    Runs every algorithm over the parameter grid on all local jobs of the dataset and prints the pareto front.
+    :param dataset: the dataset name, e.g. middlebury
+    :param algorithmNames: the names of the algorithms to tune (keys of ALGORITHMS)
+    :param blockSizes: array of block sizes
+    :param maxDisparities: array of max disparities
+    :param tolerance: allowed absolute error above the best error, used to choose the recommended values
+    :param write: None or the name of the algorithm whose recommended values are written into the config.json
+    :param repeats: count of timed runs per job and grid point
+    """
+    jobs = []
+    for jsonPath in listLocalJobs(dataset):
+        jobName = os.path.basename(os.path.dirname(jsonPath))
+        job = deserialize_json(jsonPath)
+        left, right = load(job["pathImageLeft"]), load(job["pathImageRight"])
+        gt = None
+        if job["pathDisparity"]:
+            gt = loadGroundTruth(job["pathDisparity"], job["disparityScale"])
+            if gt is None:
+                sys.exit('Job ' + jobName + ' error! Ground truth ' + job["pathDisparity"]
+                         + ' could not be read. See README for more infos.')
+            if gt.shape != left.shape:
+                sys.exit('Job ' + jobName + ' error! Ground truth shape ' + str(gt.shape)
+                         + ' does not match the image shape ' + str(left.shape) + '. See README for more infos.')
+        # score all grid points on the same region
+        region = scoreRegion(left.shape, max(maxDisparities), max(blockSizes))
+        if region is None:
+            sys.exit('Job ' + jobName + ' error! The image ' + str(left.shape) + ' is too small for the largest '
+                     + 'maxDisparity ' + str(max(maxDisparities)) + ' and blockSize ' + str(max(blockSizes)) + '.')
+        jobs.append((left, right, gt, region))
+    if not jobs:
+        print("No local jobs found for dataset " + dataset + " inside " + MAIN_DIR)
+        return
+    withGt = len([j for j in jobs if j[2] is not None])
+    print(str(len(jobs)) + " jobs found, " + str(withGt) + " with ground truth "
+          + "(error: bad pixel rate > " + str(BAD_PIXEL_THRESHOLD) + "px, otherwise left-right inconsistency, "
+          + "scored without a border of " + str(max(maxDisparities) + max(blockSizes) // 2) + " columns left and right"
+          + " and " + str(max(blockSizes) // 2) + " rows top and bottom)")
+
+    for name in algorithmNames:
+        results = []
+        for blockSize in blockSizes:
+            for maxDisparity in maxDisparities:
+                try:
+                    runtime, error = evaluate(ALGORITHMS[name], jobs, blockSize, maxDisparity, repeats)
+                except Exception as e:
+                    print("  %s blockSize=%d maxDisparity=%d: failed, skipped" % (name, blockSize, maxDisparity))
+                    print(e)
+                    continue
+                results.append({"blockSize": blockSize, "maxDisparity": maxDisparity,
+                                "runtime": runtime, "error": error})
+                print("  %s blockSize=%d maxDisparity=%d: %.3fs, error %.4f"
+                      % (name, blockSize, maxDisparity, runtime, error))
+
+        if not results:
+            print("No successful run for " + name)
+            continue
+        front = paretoFront(results)
+        chosen = choose(front, tolerance)
+        print("Pareto front " + name + ":")
+        for r in front:
+            print("  %s blockSize=%d maxDisparity=%d: %.3fs, error %.4f"
+                  % ("*" if r is chosen else " ", r["blockSize"], r["maxDisparity"], r["runtime"], r["error"]))
+
+        if write == name:
+            writeConfig(dataset, chosen["blockSize"], chosen["maxDisparity"])
+            print("config.json updated: " + dataset + " blockSize=" + str(chosen["blockSize"])
+                  + " maxDisparity=" + str(chosen["maxDisparity"]))
+
+
+def validBlockSize(value):
+    value = int(value)
+    if value % 2 == 0 or not BLOCK_SIZE_RANGE[0] <= value <= BLOCK_SIZE_RANGE[1]:
+        raise argparse.ArgumentTypeError("blockSize muss be a odd integer between %d and %d" % BLOCK_SIZE_RANGE)
+    return value
+
+
+def validMaxDisparity(value):
+    value = int(value)
+    if value % 16 != 0 or not MAX_DISPARITY_RANGE[0] <= value <= MAX_DISPARITY_RANGE[1]:
+        raise argparse.ArgumentTypeError("maxDisparity must be divisible by 16 and between %d and %d"
+                                         % MAX_DISPARITY_RANGE)
+    return value
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Speed/accuracy tuning of blockSize and maxDisparity per dataset.")
+    parser.add_argument("dataset", help="dataset name (first word of the job name until '_'), e.g. middlebury")
+    parser.add_argument("--algorithms", nargs="+", choices=ALGORITHMS.keys(), default=DEFAULT_ALGORITHMS)
+    parser.add_argument("--blockSizes", nargs="+", type=validBlockSize, default=DEFAULT_BLOCK_SIZES)
+    parser.add_argument("--maxDisparities", nargs="+", type=validMaxDisparity, default=DEFAULT_MAX_DISPARITIES)
+    parser.add_argument("--tolerance", type=float, default=0.01,
+                        help="allowed absolute error above the best error of the front for the recommended values")
+    parser.add_argument("--repeats", type=int, default=DEFAULT_REPEATS,
+                        help="timed runs per job and grid point (after one warm-up run), the minimum is used")
+    parser.add_argument("--write", choices=ALGORITHMS.keys(),
+                        help="write the recommended values of this algorithm into defaultParameter.datasets")
+    args = parser.parse_args()
+    if args.write and args.write not in args.algorithms:
+        parser.error("--write algorithm must be one of the tuned --algorithms")
+    if args.repeats < 1:
+        parser.error("--repeats must be at least 1")
+
+    tune(args.dataset, args.algorithms, args.blockSizes, args.maxDisparities, args.tolerance, args.write, args.repeats)